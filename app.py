@@ -2,20 +2,15 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
-from scipy.interpolate import griddata
 from datetime import datetime
 import io
 import json
-import tempfile
-from interpolasi import generate_property_heatmap
+from importlib.util import find_spec
+from functools import partial
+from upload_data import read_upload
 
-# ReportLab untuk PDF ringkasan volumetrik
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER
+# Modul berat (scipy, reportlab) di-import di dalam fungsi yang memakainya,
+# supaya tampilan awal (belum ada data) tidak ikut menunggu import tersebut.
 
 # --- KONFIGURASI HALAMAN ---
 st.set_page_config(page_title="Projek Pemetaan Bawah Permukaan IF-A", layout="wide", page_icon="🌍")
@@ -37,6 +32,14 @@ def create_volumetric_report_pdf(vol_gas_cap, vol_oil_zone, vol_total_res,
                                  goc_input, woc_input,
                                  num_points, x_range, y_range, z_range):
     """Membuat laporan volumetrik dalam format PDF (ringkasan)"""
+    # ReportLab untuk PDF ringkasan volumetrik
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
@@ -158,14 +161,179 @@ def create_volumetric_report_excel(vol_gas_cap, vol_oil_zone, vol_total_res,
     buffer.seek(0)
     return buffer
 
+def df_to_csv_bytes(data):
+    """Menulis DataFrame ke CSV langsung sebagai bytes, tanpa string perantara"""
+    buffer = io.BytesIO()
+    data.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+def make_grid_csv(xs, ys, grid_z):
+    """Membuat CSV grid hasil interpolasi (X, Y, Z) dalam bentuk bytes"""
+    grid_df = pd.DataFrame({
+        'X': np.tile(xs, len(ys)),
+        'Y': np.repeat(ys, len(xs)),
+        'Z': grid_z.ravel()
+    })
+    return df_to_csv_bytes(grid_df)
+
+# -------------------------------------------------------------------
+# FUNGSI HELPER UNTUK DATA TITIK
+# -------------------------------------------------------------------
+POINT_COLUMNS = ['X', 'Y', 'Z']
+
+def empty_points_df():
+    """DataFrame kosong bertipe float64 untuk menampung titik (X, Y, Z)"""
+    return pd.DataFrame({c: pd.Series(dtype='float64') for c in POINT_COLUMNS})
+
+def validate_points(data):
+    """Validasi skema titik: X, Y, Z di-cast ke float64, kembalikan juga jumlah baris tidak valid"""
+    points = data[POINT_COLUMNS].apply(pd.to_numeric, errors='coerce').astype('float64')
+    invalid_rows = int(points.isna().any(axis=1).sum())
+    return points, invalid_rows
+
+# -------------------------------------------------------------------
+# FUNGSI HELPER UNTUK INTERPOLASI GRID
+# -------------------------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_grid(points, xs, ys):
+    """Interpolasi titik (X, Y, Z) ke grid sumbu xs x ys, di-cache per kumpulan titik"""
+    from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator
+    from scipy.spatial import Delaunay
+
+    # Rata-rata Z untuk titik (X, Y) yang duplikat
+    xy_unique, inverse = np.unique(points[:, :2], axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    z_mean = np.bincount(inverse, weights=points[:, 2]) / np.bincount(inverse)
+
+    # sparse=True: grid_x (1, nx) & grid_y (ny, 1) cukup di-broadcast, tanpa dua array penuh
+    grid_x, grid_y = np.meshgrid(xs, ys, sparse=True)
+
+    # Triangulasi Delaunay (Qhull) cukup sekali, dipakai ulang oleh cubic & fallback linear
+    tri = Delaunay(xy_unique)
+    try:
+        grid_z = CloughTocher2DInterpolator(tri, z_mean)(grid_x, grid_y)
+    except Exception:
+        grid_z = LinearNDInterpolator(tri, z_mean)(grid_x, grid_y)
+
+    return grid_z
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_property_grid(points_xy, values, xs, ys):
+    """Interpolasi nilai properti per titik ke grid peta struktur, di-cache per input"""
+    from scipy.interpolate import griddata
+
+    grid_x, grid_y = np.meshgrid(xs, ys, sparse=True)
+    try:
+        return griddata(points_xy, values, (grid_x, grid_y), method='cubic')
+    except Exception:
+        return griddata(points_xy, values, (grid_x, grid_y), method='linear')
+
+def compute_volumes(grid_z, goc_input, woc_input, cell_area):
+    """Menghitung GRV di atas WOC (total reservoir) dan di atas GOC (gas cap)"""
+    # Satu buffer dipakai bergantian untuk ketebalan WOC lalu GOC, tanpa mask boolean
+    thick = np.subtract(woc_input, grid_z)
+    np.maximum(thick, 0, out=thick)
+    vol_total_res = np.nansum(thick) * cell_area
+
+    np.subtract(goc_input, grid_z, out=thick)
+    np.maximum(thick, 0, out=thick)
+    vol_gas_cap = np.nansum(thick) * cell_area
+
+    return vol_total_res, vol_gas_cap
+
+# -------------------------------------------------------------------
+# FUNGSI HELPER UNTUK VISUALISASI
+# -------------------------------------------------------------------
+def build_2d(df, xs, ys, grid_z, min_z, max_z):
+    """Membuat peta kontur 2D beserta titik data berwarna sesuai zona fluida"""
+    fig_2d = go.Figure()
+    fig_2d.add_trace(go.Contour(
+        # float32 cukup untuk visualisasi kedalaman dan memangkas payload ke browser
+        z=grid_z.astype(np.float32, copy=False),
+        x=xs,
+        y=ys,
+        colorscale='Greys',
+        opacity=0.4,
+        contours=dict(
+            start=min_z,
+            end=max_z,
+            size=(max_z - min_z) / 10 if max_z != min_z else 1,
+            showlabels=True
+        ),
+        name='Structure'
+    ))
+
+    # Satu trace untuk semua titik, warna per titik diambil dari zona fluidanya
+    colors_map = {'Gas Cap': 'red', 'Oil Zone': 'green', 'Aquifer': 'blue'}
+    fig_2d.add_trace(go.Scatter(
+        x=df['X'],
+        y=df['Y'],
+        mode='markers+text',
+        text=df['Z'].astype(int),
+        textposition="top center",
+        marker=dict(size=10, color=df['Fluid'].map(colors_map), line=dict(width=1, color='black')),
+        customdata=df['Fluid'],
+        hovertemplate="X: %{x}<br>Y: %{y}<br>Z: %{text}<br>Zona: %{customdata}<extra></extra>",
+        name='Titik Data',
+        showlegend=False
+    ))
+
+    # Keterangan warna zona fluida: trace kosong yang hanya tampil di legend
+    for fluid, color in colors_map.items():
+        fig_2d.add_trace(go.Scatter(
+            x=[None],
+            y=[None],
+            mode='markers',
+            marker=dict(size=10, color=color, line=dict(width=1, color='black')),
+            name=fluid
+        ))
+
+    fig_2d.update_layout(height=650, margin=dict(l=20, r=20, t=40, b=20),
+                         xaxis_title="X Coordinate", yaxis_title="Y Coordinate")
+    return fig_2d
+
+def build_3d(df, xs, ys, grid_z, goc_input, woc_input, min_z):
+    """Membuat model permukaan 3D dengan bidang GOC/WOC dan posisi sumur"""
+    fig_3d = go.Figure()
+    grid_z32 = grid_z.astype(np.float32, copy=False)
+    fig_3d.add_trace(go.Surface(z=grid_z32, x=xs, y=ys, colorscale='Earth_r', opacity=0.9, name='Structure'))
+
+    def create_plane(z_lvl, color, name):
+        return go.Surface(z=np.broadcast_to(np.float32(z_lvl), grid_z32.shape), x=xs, y=ys,
+                          colorscale=[[0, color], [1, color]], opacity=0.4, showscale=False, name=name)
+
+    fig_3d.add_trace(create_plane(goc_input, 'red', 'GOC'))
+    fig_3d.add_trace(create_plane(woc_input, 'blue', 'WOC'))
+
+    # Semua sumur dalam satu trace: tiap segmen [min_z -> Z] dipisah NaN agar garis terputus
+    gap = np.full(len(df), np.nan)
+    well_x = np.column_stack([df['X'], df['X'], gap]).ravel()
+    well_y = np.column_stack([df['Y'], df['Y'], gap]).ravel()
+    well_z = np.column_stack([np.full(len(df), min_z), df['Z'], gap]).ravel()
+    fig_3d.add_trace(go.Scatter3d(
+        x=well_x, y=well_y, z=well_z,
+        mode='lines+markers', marker=dict(size=3, color='black'), line=dict(color='black', width=4), showlegend=False
+    ))
+
+    fig_3d.update_layout(scene=dict(xaxis_title='X', yaxis_title='Y', zaxis_title='Depth', zaxis=dict(autorange="reversed")),
+                         height=650, margin=dict(l=0, r=0, b=0, t=0))
+    return fig_3d
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def fig_to_png(fig_json, width, height):
+    """Render figure (dalam bentuk JSON) ke PNG via kaleido, di-cache selama figure tidak berubah"""
+    fig = go.Figure(json.loads(fig_json))
+    return fig.to_image(format="png", width=width, height=height)
+
 # --- JUDUL UTAMA ---
 st.title("Proyek Pemetaan Bawah Permukaan IF-A")
 st.title("🌍 3D Reservoir Visualization")
 st.markdown("Interactive Structural Map, Fluid Contact & Reserves Calculator")
 
 # --- 1. INISIALISASI SESSION STATE ---
-if 'data_points' not in st.session_state:
-    st.session_state['data_points'] = []
+# Titik disimpan langsung sebagai DataFrame bertipe, tidak dibangun ulang dari list tiap rerun
+if 'df' not in st.session_state:
+    st.session_state['df'] = empty_points_df()
 
 # --- 2. SIDEBAR ---
 with st.sidebar:
@@ -186,11 +354,16 @@ with st.sidebar:
         submit_button = st.form_submit_button(label='➕ Tambah Titik', type="primary")
 
     if submit_button:
-        st.session_state['data_points'].append({'X': x_val, 'Y': y_val, 'Z': z_val})
+        st.session_state['df'].loc[len(st.session_state['df'])] = [x_val, y_val, z_val]
         st.toast(f"Titik ({x_val}, {y_val}, {z_val}) berhasil disimpan!", icon='✅')
 
     # --- BAGIAN B: STATUS DATA ---
-    df = pd.DataFrame(st.session_state['data_points'])
+    df = st.session_state['df']
+    # Rentang X/Y/Z dihitung sekali (satu agregasi) lalu dipakai di seluruh halaman
+    if not df.empty:
+        (x_min, y_min, min_z), (x_max, y_max, max_z) = df[POINT_COLUMNS].agg(['min', 'max']).to_numpy()
+    else:
+        x_min = x_max = y_min = y_max = min_z = max_z = 0.0
     
     if not df.empty:
         st.divider()
@@ -198,14 +371,12 @@ with st.sidebar:
         
         m1, m2 = st.columns(2)
         m1.metric("Total Titik", len(df))
-        m2.metric("Kedalaman Max", f"{df['Z'].max()} m")
+        m2.metric("Kedalaman Max", f"{max_z} m")
         
         # --- BAGIAN C: KONTAK FLUIDA ---
         st.divider()
         st.markdown("### 💧 Kontak Fluida")
         
-        min_z, max_z = df['Z'].min(), df['Z'].max()
-        
         st.markdown(":red[Gas-Oil Contact (GOC)]")
         goc_input = st.number_input(
             "",
@@ -243,10 +414,7 @@ with st.sidebar:
         
         if uploaded_file is not None:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df_upload = pd.read_csv(uploaded_file)
-                else:
-                    df_upload = pd.read_excel(uploaded_file)
+                df_upload = read_upload(uploaded_file)
                     
                 st.caption("🔎 Preview data yang kamu upload:")
                 st.dataframe(df_upload.head(), use_container_width=True)
@@ -258,19 +426,20 @@ with st.sidebar:
                     st.error("❌ Eits, file ini kosong !")
                     st.stop() # Stop program biar gak error di bawah
                 
-                # Cek sekilas apakah data aman
-                if {'X', 'Y', 'Z'}.issubset(df_upload.columns):
-                    st.toast("✅ Data Integrity Check: OK", icon="🛡")
-                    
                 required_cols = {'X', 'Y', 'Z'}
                 
                 if required_cols.issubset(df_upload.columns):
-                    st.success(f"File valid! {len(df_upload)} baris data.")
-                    if st.button("📥 Muat Data ke Aplikasi", type="primary"):
-                        new_data = df_upload[['X', 'Y', 'Z']].to_dict('records')
-                        st.session_state['data_points'].extend(new_data)
-                        st.toast(f"Berhasil menambahkan {len(new_data)} titik!", icon='✅')
-                        st.rerun()
+                    new_data, invalid_rows = validate_points(df_upload)
+                    if invalid_rows:
+                        st.error(f"❌ {invalid_rows} baris punya nilai X/Y/Z kosong atau bukan angka. Perbaiki file dulu ya.")
+                    else:
+                        # Integrity check baru dinyatakan OK setelah skema X/Y/Z lolos validasi
+                        st.toast("✅ Data Integrity Check: OK", icon="🛡")
+                        st.success(f"File valid! {len(new_data)} baris data.")
+                        if st.button("📥 Muat Data ke Aplikasi", type="primary"):
+                            st.session_state['df'] = pd.concat([st.session_state['df'], new_data], ignore_index=True)
+                            st.toast(f"Berhasil menambahkan {len(new_data)} titik!", icon='✅')
+                            st.rerun()
                 else:
                     st.error(f"Format salah! File harus punya kolom: {required_cols}")
             except Exception as e:
@@ -279,11 +448,11 @@ with st.sidebar:
     # --- PENGATURAN DATA ---
     with st.expander("⚙ Pengaturan Data", expanded=False):
         if st.button("🔄 Reset Semua Data"):
-            st.session_state['data_points'] = []
+            st.session_state['df'] = empty_points_df()
             st.rerun()
         
         if st.button("📂 Load Data Demo"):
-            st.session_state['data_points'] = [
+            st.session_state['df'] = pd.DataFrame([
                 {'X': 100, 'Y': 100, 'Z': 1300}, {'X': 300, 'Y': 100, 'Z': 1300},
                 {'X': 100, 'Y': 300, 'Z': 1300}, {'X': 300, 'Y': 300, 'Z': 1300},
                 {'X': 200, 'Y': 200, 'Z': 1000},  # Puncak
@@ -291,13 +460,14 @@ with st.sidebar:
                 {'X': 100, 'Y': 200, 'Z': 1150}, {'X': 300, 'Y': 200, 'Z': 1150},
                 {'X': 150, 'Y': 150, 'Z': 1100}, {'X': 250, 'Y': 250, 'Z': 1100},
                 {'X': 150, 'Y': 250, 'Z': 1100}, {'X': 250, 'Y': 150, 'Z': 1100}
-            ]
+            ], dtype='float64')
             st.rerun()
             
         # --- Hapus titik terakhir ---
         if st.button("➖ Hapus Titik Terakhir"):
-            if len(st.session_state['data_points']) > 0:
-                removed = st.session_state['data_points'].pop()
+            if len(st.session_state['df']) > 0:
+                removed = st.session_state['df'].iloc[-1].to_dict()
+                st.session_state['df'] = st.session_state['df'].drop(st.session_state['df'].index[-1])
                 st.toast(f"Titik terakhir {removed} dihapus.", icon="🗑")
                 st.rerun()
             else:
@@ -308,7 +478,7 @@ with st.sidebar:
         st.markdown("### 📤 Export CSV")
 
         if not df.empty:
-            csv_data = df.to_csv(index=False).encode('utf-8')
+            csv_data = df_to_csv_bytes(df)
 
             st.download_button(
                 label="⬇ Download CSV Data",
@@ -323,7 +493,7 @@ with st.sidebar:
         col_save1, col_save2 = st.columns(2)
         
         with col_save1:
-            session_json = json.dumps(st.session_state['data_points'], indent=2)
+            session_json = st.session_state['df'].to_json(orient='records', indent=2)
             st.download_button(
                 label="💾 Save Session",
                 data=session_json,
@@ -341,7 +511,7 @@ with st.sidebar:
                         ('X' in item and 'Y' in item and 'Z' in item) for item in session_data
                     ):
                         if st.button("📥 Muat Session", key="load_session"):
-                            st.session_state['data_points'] = session_data
+                            st.session_state['df'] = pd.DataFrame(session_data, columns=POINT_COLUMNS).astype('float64')
                             st.toast("Session berhasil dimuat!", icon='✅')
                             st.rerun()
                     else:
@@ -356,46 +526,23 @@ if df.empty:
 else:
     # Minimal 4 titik untuk kontur yang baik
     if len(df) >= 4:
-        df_unique = df.groupby(['X', 'Y'], as_index=False)['Z'].mean()
-        grid_x = np.linspace(df['X'].min(), df['X'].max(), 100)
-        grid_y = np.linspace(df['Y'].min(), df['Y'].max(), 100)
-        grid_x, grid_y = np.meshgrid(grid_x, grid_y)
+        # Sumbu grid 1D dibuat sekali, dipakai interpolasi, figure, dan export
+        nx, ny = 100, 100
+        xs = np.linspace(x_min, x_max, nx)
+        ys = np.linspace(y_min, y_max, ny)
 
-        try:
-            grid_z = griddata(
-                (df_unique['X'], df_unique['Y']),
-                df_unique['Z'],
-                (grid_x, grid_y),
-                method='cubic'
-            )
-        except Exception:
-            grid_z = griddata(
-                (df_unique['X'], df_unique['Y']),
-                df_unique['Z'],
-                (grid_x, grid_y),
-                method='linear'
-            )
+        # Grid hanya bergantung pada titik data, bukan GOC/WOC -> aman di-cache
+        grid_z = compute_grid(df[POINT_COLUMNS].to_numpy(dtype=float), xs, ys)
 
         # --- PERHITUNGAN VOLUME ---
         st.markdown("### 📊 Estimasi Volume & Cadangan")
         
-        x_min, x_max = df['X'].min(), df['X'].max()
-        y_min, y_max = df['Y'].min(), df['Y'].max()
-        nx, ny = 100, 100
-        
         dx = (x_max - x_min) / (nx - 1)
         dy = (y_max - y_min) / (ny - 1)
         cell_area = dx * dy
         
-        # Volume di atas WOC (Total Reservoir)
-        thick_above_woc = woc_input - grid_z
-        thick_above_woc[thick_above_woc < 0] = 0
-        vol_total_res = np.nansum(thick_above_woc) * cell_area
-        
-        # Volume di atas GOC (Gas Cap)
-        thick_above_goc = goc_input - grid_z
-        thick_above_goc[thick_above_goc < 0] = 0
-        vol_gas_cap = np.nansum(thick_above_goc) * cell_area
+        # Volume di atas WOC (Total Reservoir) & di atas GOC (Gas Cap)
+        vol_total_res, vol_gas_cap = compute_volumes(grid_z, goc_input, woc_input, cell_area)
         
         # Volume Oil = selisih
         vol_oil_zone = max(0, vol_total_res - vol_gas_cap)
@@ -419,62 +566,56 @@ else:
         # --- EXPORT LAPORAN VOLUMETRIK ---
         st.markdown("### 📄 Export Laporan Volumetrik")
         col_exp1, col_exp2, col_exp3 = st.columns(3)
+        # Laporan PDF/Excel baru dibangun saat tombolnya diklik, bukan di setiap rerun.
+        # Error di dalam callable tidak sampai ke halaman, jadi dependensinya dicek di sini.
         
         with col_exp1:
-            try:
-                pdf_buffer = create_volumetric_report_pdf(
-                    vol_gas_cap, vol_oil_zone, vol_total_res,
-                    goc_input, woc_input,
-                    len(df),
-                    (df['X'].min(), df['X'].max()),
-                    (df['Y'].min(), df['Y'].max()),
-                    (df['Z'].min(), df['Z'].max())
-                )
+            if find_spec("reportlab") is None:
+                st.error("Error membuat PDF: modul reportlab belum terpasang.")
+            else:
                 st.download_button(
                     label="📄 Download PDF Report",
-                    data=pdf_buffer,
+                    data=partial(
+                        create_volumetric_report_pdf,
+                        vol_gas_cap, vol_oil_zone, vol_total_res,
+                        goc_input, woc_input,
+                        len(df),
+                        (x_min, x_max),
+                        (y_min, y_max),
+                        (min_z, max_z)
+                    ),
                     file_name=f"volumetric_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
                     mime="application/pdf"
                 )
-            except Exception as e:
-                st.error(f"Error membuat PDF: {e}")
         
         with col_exp2:
-            try:
-                excel_buffer = create_volumetric_report_excel(
-                    vol_gas_cap, vol_oil_zone, vol_total_res,
-                    goc_input, woc_input,
-                    len(df),
-                    (df['X'].min(), df['X'].max()),
-                    (df['Y'].min(), df['Y'].max()),
-                    (df['Z'].min(), df['Z'].max()),
-                    df
-                )
+            if find_spec("openpyxl") is None:
+                st.error("Error membuat Excel: modul openpyxl belum terpasang.")
+            else:
                 st.download_button(
                     label="📊 Download Excel Report",
-                    data=excel_buffer,
+                    data=partial(
+                        create_volumetric_report_excel,
+                        vol_gas_cap, vol_oil_zone, vol_total_res,
+                        goc_input, woc_input,
+                        len(df),
+                        (x_min, x_max),
+                        (y_min, y_max),
+                        (min_z, max_z),
+                        df
+                    ),
                     file_name=f"volumetric_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
-            except Exception as e:
-                st.error(f"Error membuat Excel: {e}")
         
         with col_exp3:
-            try:
-                grid_df = pd.DataFrame({
-                    'X': grid_x.flatten(),
-                    'Y': grid_y.flatten(),
-                    'Z': grid_z.flatten()
-                })
-                grid_csv = grid_df.to_csv(index=False)
-                st.download_button(
-                    label="📥 Download Grid Data (CSV)",
-                    data=grid_csv,
-                    file_name=f"grid_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
-                )
-            except Exception as e:
-                st.error(f"Error membuat CSV: {e}")
+            # CSV grid baru dibuat saat tombol diklik, bukan di setiap rerun
+            st.download_button(
+                label="📥 Download Grid Data (CSV)",
+                data=partial(make_grid_csv, xs, ys, grid_z),
+                file_name=f"grid_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv"
+            )
 
         # --- TABS VISUALISASI (5 TAB) ---
       # --- TABS VISUALISASI (5 TAB) ---
@@ -486,110 +627,28 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "🔥 Heatmap Property"
 ])
 
-# pastikan ada minimal info untuk min_z / max_z (dipakai di beberapa tab)
-if not df.empty:
-    min_z, max_z = df['Z'].min(), df['Z'].max()
-else:
-    min_z, max_z = 0.0, 0.0
-
 # --- jika data cukup, jalankan perhitungan dan isi semua tab ---
 if len(df) >= 4:
-    # grid & interpolasi (siapkan aman dengan try/except)
-    df_unique = df.groupby(['X', 'Y'], as_index=False)['Z'].mean()
-    grid_x = np.linspace(df['X'].min(), df['X'].max(), 100)
-    grid_y = np.linspace(df['Y'].min(), df['Y'].max(), 100)
-    grid_x, grid_y = np.meshgrid(grid_x, grid_y)
-
-    try:
-        grid_z = griddata(
-            (df_unique['X'], df_unique['Y']),
-            df_unique['Z'],
-            (grid_x, grid_y),
-            method='cubic'
-        )
-    except Exception:
-        grid_z = griddata(
-            (df_unique['X'], df_unique['Y']),
-            df_unique['Z'],
-            (grid_x, grid_y),
-            method='linear'
-        )
-
-    # -- PERHITUNGAN VOLUME & CADANGAN (tetap di sini, karena cuma kalau data cukup) --
-    x_min, x_max = df['X'].min(), df['X'].max()
-    y_min, y_max = df['Y'].min(), df['Y'].max()
-    nx, ny = 100, 100
-    dx = (x_max - x_min) / (nx - 1) if nx > 1 else 1.0
-    dy = (y_max - y_min) / (ny - 1) if ny > 1 else 1.0
-    cell_area = dx * dy
-
-    thick_above_woc = woc_input - grid_z
-    thick_above_woc[thick_above_woc < 0] = 0
-    vol_total_res = np.nansum(thick_above_woc) * cell_area
-
-    thick_above_goc = goc_input - grid_z
-    thick_above_goc[thick_above_goc < 0] = 0
-    vol_gas_cap = np.nansum(thick_above_goc) * cell_area
-
-    vol_oil_zone = max(0, vol_total_res - vol_gas_cap)
-
-    stoiip = (vol_oil_zone * ntg * porosity * (1 - sw)) / bo
-    giip = (vol_gas_cap * ntg * porosity * (1 - sw)) / bg
-
-    # Metrics (bisa di atas tab atau di salah satu tab — saya tampilkan di atas tab1 untuk ringkasan)
-    col_a, col_b, col_c = st.columns(3)
-    col_a.metric("🔴 Gross Gas Volume", f"{vol_gas_cap/1e6:.2f} Juta m³")
-    col_b.metric("🟢 Gross Oil Volume", f"{vol_oil_zone/1e6:.2f} Juta m³")
-    col_c.metric("🔵 Total Reservoir", f"{vol_total_res/1e6:.2f} Juta m³")
+    # Klasifikasi zona fluida per titik (dipakai peta 2D & tab data mentah) dalam satu pass:
+    # indeks 0 = Gas Cap (Z < GOC), 1 = Oil Zone (GOC <= Z <= WOC), 2 = Aquifer (Z > WOC).
+    # nextafter membuat Z == WOC tetap Oil Zone; max() menjaga bins monoton saat GOC > WOC.
+    fluid_labels = np.array(['Gas Cap', 'Oil Zone', 'Aquifer'])
+    fluid_bins = [goc_input, max(goc_input, np.nextafter(woc_input, np.inf))]
+    fluid_idx = np.digitize(df['Z'].to_numpy(), fluid_bins)
+    # assign() agar kolom Fluid tidak ikut tersimpan di DataFrame session_state
+    df = df.assign(Fluid=fluid_labels[fluid_idx])
+
+    # Figure dibangun sekali per rerun, dipakai untuk tampilan maupun export
+    fig_2d = build_2d(df, xs, ys, grid_z, min_z, max_z)
+    fig_3d = build_3d(df, xs, ys, grid_z, goc_input, woc_input, min_z)
 
     # === TAB 1: 2D ===
     with tab1:
-        fig_2d = go.Figure()
-        fig_2d.add_trace(go.Contour(
-            z=grid_z,
-            x=np.linspace(x_min, x_max, grid_z.shape[1]),
-            y=np.linspace(y_min, y_max, grid_z.shape[0]),
-            colorscale='Greys',
-            opacity=0.4,
-            contours=dict(
-                start=min_z,
-                end=max_z,
-                size=(max_z - min_z) / 10 if max_z != min_z else 1,
-                showlabels=True
-            ),
-            name='Structure'
-        ))
-
-        # point overlay colored by fluid
-        conditions = [
-            (df['Z'] < goc_input),
-            (df['Z'] >= goc_input) & (df['Z'] <= woc_input),
-            (df['Z'] > woc_input)
-        ]
-        choices = ['Gas Cap', 'Oil Zone', 'Aquifer']
-        colors_map = {'Gas Cap': 'red', 'Oil Zone': 'green', 'Aquifer': 'blue'}
-        df['Fluid'] = np.select(conditions, choices, default='Unknown')
-
-        for fluid in choices:
-            subset = df[df['Fluid'] == fluid]
-            if not subset.empty:
-                fig_2d.add_trace(go.Scatter(
-                    x=subset['X'],
-                    y=subset['Y'],
-                    mode='markers+text',
-                    text=subset['Z'].astype(int),
-                    textposition="top center",
-                    marker=dict(size=10, color=colors_map[fluid], line=dict(width=1, color='black')),
-                    name=fluid
-                ))
-
-        fig_2d.update_layout(height=650, margin=dict(l=20, r=20, t=40, b=20),
-                             xaxis_title="X Coordinate", yaxis_title="Y Coordinate")
         st.plotly_chart(fig_2d, use_container_width=True)
 
         # Export
         try:
-            img_2d_png = fig_2d.to_image(format="png", width=1200, height=800)
+            img_2d_png = fig_to_png(fig_2d.to_json(), 1200, 800)
             st.download_button("🖼 Download PNG", data=img_2d_png,
                                file_name=f"contour_2d_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
                                mime="image/png")
@@ -598,30 +657,12 @@ if len(df) >= 4:
 
     # === TAB 2: 3D ===
     with tab2:
-        fig_3d = go.Figure()
-        fig_3d.add_trace(go.Surface(z=grid_z, x=grid_x, y=grid_y, colorscale='Earth_r', opacity=0.9, name='Structure'))
-
-        def create_plane(z_lvl, color, name):
-            return go.Surface(z=z_lvl * np.ones_like(grid_z), x=grid_x, y=grid_y,
-                              colorscale=[[0, color], [1, color]], opacity=0.4, showscale=False, name=name)
-
-        fig_3d.add_trace(create_plane(goc_input, 'red', 'GOC'))
-        fig_3d.add_trace(create_plane(woc_input, 'blue', 'WOC'))
-
-        for _, row in df.iterrows():
-            fig_3d.add_trace(go.Scatter3d(
-                x=[row['X'], row['X']], y=[row['Y'], row['Y']], z=[min_z, row['Z']],
-                mode='lines+markers', marker=dict(size=3, color='black'), line=dict(color='black', width=4), showlegend=False
-            ))
-
-        fig_3d.update_layout(scene=dict(xaxis_title='X', yaxis_title='Y', zaxis_title='Depth', zaxis=dict(autorange="reversed")),
-                             height=650, margin=dict(l=0, r=0, b=0, t=0))
         st.plotly_chart(fig_3d, use_container_width=True)
 
     # === TAB 3: DATA MENTAH ===
     with tab3:
         st.dataframe(df, use_container_width=True)
-        csv_data = df.to_csv(index=False)
+        csv_data = df_to_csv_bytes(df)
         st.download_button("📥 Download CSV", data=csv_data,
                            file_name=f"raw_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                            mime="text/csv")
@@ -631,10 +672,10 @@ if len(df) >= 4:
         st.markdown("##### ✂ Penampang Melintang (Cross-Section)")
         st.caption("Geser slider untuk memotong peta dari Barat ke Timur pada posisi Y tertentu.")
         slice_y = st.slider("Pilih Posisi Irisan Y", float(y_min), float(y_max), float((y_min + y_max) / 2))
-        idx_y = (np.abs(grid_y[:, 0] - slice_y)).argmin()
+        idx_y = (np.abs(ys - slice_y)).argmin()
         z_profile = grid_z[idx_y, :]
         fig_xs = go.Figure()
-        fig_xs.add_trace(go.Scatter(x=grid_x[0, :], y=z_profile, mode='lines', fill='tozeroy', name='Top Structure'))
+        fig_xs.add_trace(go.Scatter(x=xs, y=z_profile, mode='lines', fill='tozeroy', name='Top Structure'))
         fig_xs.add_hline(y=goc_input, line_dash="dash", line_color="red", annotation_text="GOC")
         fig_xs.add_hline(y=woc_input, line_dash="dash", line_color="blue", annotation_text="WOC")
         fig_xs.update_yaxes(autorange="reversed", title="Depth (m)")
@@ -674,15 +715,14 @@ if len(df) >= 4:
         if prop_values is None:
             st.info("Belum ada property yang valid untuk di-interpolasi.")
         else:
-            try:
-                grid_prop = griddata((df["X"], df["Y"]), prop_values, (grid_x, grid_y), method='cubic')
-            except Exception:
-                grid_prop = griddata((df["X"], df["Y"]), prop_values, (grid_x, grid_y), method='linear')
+            grid_prop = compute_property_grid(df[['X', 'Y']].to_numpy(dtype=float),
+                                              np.asarray(prop_values, dtype=float),
+                                              xs, ys)
 
             fig_heat = go.Figure(data=go.Heatmap(
-                x=np.linspace(x_min, x_max, grid_prop.shape[1]),
-                y=np.linspace(y_min, y_max, grid_prop.shape[0]),
-                z=grid_prop,
+                x=xs,
+                y=ys,
+                z=grid_prop.astype(np.float32, copy=False),
                 colorscale="Viridis",
                 colorbar=dict(title=f"{option}")
             ))
@@ -690,9 +730,11 @@ if len(df) >= 4:
             st.plotly_chart(fig_heat, use_container_width=True)
 
             # export
-            heat_df = pd.DataFrame({'X': grid_x.flatten(), 'Y': grid_y.flatten(), option: grid_prop.flatten()})
+            heat_df = pd.DataFrame({'X': np.tile(xs, len(ys)),
+                                    'Y': np.repeat(ys, len(xs)),
+                                    option: grid_prop.ravel()})
             st.download_button(label=f"⬇ Download {option} Heatmap CSV",
-                               data=heat_df.to_csv(index=False),
+                               data=df_to_csv_bytes(heat_df),
                                file_name=f"heatmap_{option.replace(' ','')}{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                                mime="text/csv")
 
@@ -710,7 +752,7 @@ else:
         st.subheader("📋 Data Mentah")
         st.dataframe(df, use_container_width=True)
         if not df.empty:
-            st.download_button("📥 Download CSV", data=df.to_csv(index=False), file_name="raw_data.csv", mime="text/csv")
+            st.download_button("📥 Download CSV", data=df_to_csv_bytes(df), file_name="raw_data.csv", mime="text/csv")
 
     with tab4:
         st.info("Penampang (Cross-section) akan aktif saat data cukup (>=4 titik).")
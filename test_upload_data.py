@@ -0,0 +1,29 @@
+import io
+
+import pytest
+
+from upload_data import read_upload
+
+
+def make_upload(content, name='data.csv'):
+    uploaded_file = io.BytesIO(content)
+    uploaded_file.name = name
+    return uploaded_file
+
+
+def test_trailing_blank_line_is_not_a_row():
+    df_upload = read_upload(make_upload(b"X,Y,Z\n1,2,3\n4,5,6\n\n"))
+    assert len(df_upload) == 2
+    assert not df_upload.isna().any().any()
+
+
+def test_trailing_comma_falls_back_to_pandas():
+    df_upload = read_upload(make_upload(b"X,Y,Z\n1,2,3,\n4,5,6,\n"))
+    assert len(df_upload) == 2
+
+
+def test_decimal_after_many_integer_rows():
+    rows = "".join(f"{i},{i},1000\n" for i in range(200))
+    df_upload = read_upload(make_upload(f"X,Y,Z\n{rows}200.5,201,1300.25\n".encode()))
+    assert len(df_upload) == 201
+    assert df_upload['X'].iloc[-1] == pytest.approx(200.5)
@@ -0,0 +1,26 @@
+# upload_data.py
+
+import pandas as pd
+
+
+def read_upload(uploaded_file):
+    """Membaca file upload; CSV diparse Polars (multi-thread) bila terpasang, selain itu pakai pandas"""
+    if not uploaded_file.name.endswith('.csv'):
+        return pd.read_excel(uploaded_file)
+    try:
+        import polars as pl
+    except ImportError:
+        return pd.read_csv(uploaded_file)
+
+    try:
+        # infer_schema_length=None: tipe kolom ditentukan dari seluruh baris, bukan hanya 100 baris pertama
+        # (mis. kolom yang baru berisi desimal setelah ratusan baris bilangan bulat)
+        df_upload = pl.read_csv(uploaded_file, infer_schema_length=None).to_pandas()
+    except (Exception, pl.exceptions.PanicException):
+        # Polars lebih ketat dari pandas (koma di akhir baris, encoding non-UTF-8, ...):
+        # ulangi dengan pandas supaya file yang dulu terbaca tetap bisa dimuat
+        uploaded_file.seek(0)
+        return pd.read_csv(uploaded_file)
+
+    # Baris kosong di akhir file dibaca Polars sebagai baris null, pandas melewatinya
+    return df_upload.dropna(how='all').reset_index(drop=True)